@@ -1,73 +1,107 @@
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import sqlite3
 import pandas as pd
+import queue
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 
-# Data model classes
-class MenuItem:
-    def __init__(self, id, name, price, cost):
-        self.id = id
-        self.name = name
-        self.price = price
-        self.cost = cost
+# Menu row layout. Rows travel as plain tuples: st.cache_data pickles its
+# values, and a class defined in this script gets a fresh identity every
+# time Streamlit re-execs it, so cached instances from an earlier run
+# fail to unpickle. Wrap with MenuItem._make where attribute access helps.
+MenuItem = namedtuple('MenuItem', ['id', 'name', 'price', 'cost'])
 
 # Database handler
 class RestaurantDB:
     def __init__(self, db_name="restaurant.db"):
-        self.conn = sqlite3.connect(db_name, check_same_thread=False)
+        # cached_statements keeps more hot statements compiled across the
+        # session; isolation_level=None stops sqlite3 from inserting its
+        # own BEGINs so transaction scope is exactly the explicit
+        # BEGIN IMMEDIATE blocks below.
+        self.conn = sqlite3.connect(
+            db_name, check_same_thread=False, cached_statements=256, isolation_level=None
+        )
+        # WAL lets readers proceed during writes; NORMAL sync halves the
+        # fsync cost of each button-click commit.
+        self.conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            PRAGMA busy_timeout=5000;
+            PRAGMA cache_size=-20000;
+            PRAGMA temp_store=MEMORY;
+            PRAGMA foreign_keys=ON;
+        """)
         self._create_tables()
+        # Read-only pool: under WAL, read-only connections never contend
+        # with the writer's locks, so concurrent sessions can query while
+        # a write is in flight. All INSERT/DELETE/ALTER stay on self.conn.
+        self._readers = queue.Queue()
+        for _ in range(4):
+            reader = sqlite3.connect(f"file:{db_name}?mode=ro", uri=True, check_same_thread=False)
+            reader.execute("PRAGMA busy_timeout=5000")
+            self._readers.put(reader)
+
+    @contextmanager
+    def _reader(self):
+        conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
 
     def _create_tables(self):
-        cursor = self.conn.cursor()
-        # Create menu table
-        cursor.execute("""
+        # One executescript call: a single parse pass and one implicit
+        # transaction for the whole schema instead of a statement per call.
+        # Indexes: delete_menu_item filters order_items by menu_id; the
+        # created_at index lives in the migration block below so legacy
+        # databases gain the column first.
+        self.conn.executescript("""
             CREATE TABLE IF NOT EXISTS menu (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 name TEXT,
                 price REAL,
                 cost REAL DEFAULT 0.0
-            )
-        """)
-        # Create orders table
-        cursor.execute("""
+            );
             CREATE TABLE IF NOT EXISTS orders (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 total_revenue REAL DEFAULT 0.0,
                 total_cost REAL DEFAULT 0.0
-            )
-        """)
-        # Create order_items table
-        cursor.execute("""
+            );
             CREATE TABLE IF NOT EXISTS order_items (
                 order_id INTEGER,
                 menu_id INTEGER,
                 FOREIGN KEY(order_id) REFERENCES orders(id) ON DELETE CASCADE,
                 FOREIGN KEY(menu_id) REFERENCES menu(id) ON DELETE CASCADE
-            )
-        """)
-
-         # Create miscellaneous_expense table
-        cursor.execute("""
+            );
             CREATE TABLE IF NOT EXISTS miscellaneous_expense (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 date DATE DEFAULT (DATE('now')),
                 amount REAL,
                 note TEXT
-            )
-        """)
-        # Create billings table
-        cursor.execute("""
+            );
             CREATE TABLE IF NOT EXISTS billings (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 month TEXT,
                 total_amount REAL
-            )
+            );
+            CREATE INDEX IF NOT EXISTS idx_oi_menu ON order_items(menu_id);
+            CREATE INDEX IF NOT EXISTS idx_oi_order ON order_items(order_id);
         """)
-        self.conn.commit()
+        cursor = self.conn.cursor()
 
-        
-        # Migrate menu
+        # Migrations only matter for databases created before these columns
+        # existed; user_version marks the schema as current so subsequent
+        # boots skip the table_info probes.
+        cursor.execute("PRAGMA user_version")
+        if cursor.fetchone()[0] >= 1:
+            return
+        # Migrate menu: CREATE TABLE IF NOT EXISTS is a no-op on an
+        # existing table, so pre-cost databases still need the ALTER
         cursor.execute("PRAGMA table_info(menu)")
         if 'cost' not in [col[1] for col in cursor.fetchall()]:
             cursor.execute("ALTER TABLE menu ADD COLUMN cost REAL DEFAULT 0.0")
@@ -81,142 +115,244 @@ class RestaurantDB:
             cursor.execute("ALTER TABLE orders ADD COLUMN total_revenue REAL DEFAULT 0.0")
         if 'total_cost' not in order_cols:
             cursor.execute("ALTER TABLE orders ADD COLUMN total_cost REAL DEFAULT 0.0")
+        # Created down here so legacy databases gain created_at first
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_created ON orders(created_at)")
+        cursor.execute("PRAGMA user_version = 1")
         self.conn.commit()
 
     def add_menu_item(self, name, price, cost):
-        cursor = self.conn.cursor()
-        cursor.execute("INSERT INTO menu (name, price, cost) VALUES (?, ?, ?)", (name, price, cost))
-        self.conn.commit()
+        # conn.execute reuses the connection's implicit cursor; with the
+        # connection in autocommit, a lone INSERT is durable on its own
+        # and multi-statement methods open explicit BEGIN IMMEDIATE blocks.
+        with self.conn:
+            self.conn.execute("INSERT INTO menu (name, price, cost) VALUES (?, ?, ?)", (name, price, cost))
 
     def get_menu(self):
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT id, name, price, cost FROM menu")
-        return [MenuItem(*row) for row in cursor.fetchall()]
+        # Plain picklable tuples; see the MenuItem note above.
+        with self._reader() as conn:
+            return conn.execute("SELECT id, name, price, cost FROM menu").fetchall()
 
-    def delete_menu_item(self, item_id):
-        cursor = self.conn.cursor()
-        cursor.execute("DELETE FROM order_items WHERE menu_id = ?", (item_id,))
-        cursor.execute("DELETE FROM menu WHERE id = ?", (item_id,))
-        self.conn.commit()
+    def delete_menu_items(self, item_ids):
+        # Batch form: one transaction and two IN-list deletes however
+        # many rows are selected.
+        placeholders = ",".join("?" * len(item_ids))
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.execute(f"DELETE FROM order_items WHERE menu_id IN ({placeholders})", item_ids)
+            self.conn.execute(f"DELETE FROM menu WHERE id IN ({placeholders})", item_ids)
 
     def place_order(self, item_ids):
-        cursor = self.conn.cursor()
-        total_rev, total_cost = 0.0, 0.0
-        for item_id in item_ids:
-            cursor.execute("SELECT price, cost FROM menu WHERE id = ?", (item_id,))
-            row = cursor.fetchone()
-            if row:
-                total_rev += row[0]
-                total_cost += row[1]
-        cursor.execute("INSERT INTO orders (total_revenue, total_cost) VALUES (?, ?)", (total_rev, total_cost))
-        order_id = cursor.lastrowid
-        for item_id in item_ids:
-            cursor.execute("INSERT INTO order_items (order_id, menu_id) VALUES (?, ?)", (order_id, item_id))
-        self.conn.commit()
+        # One aggregated SELECT and one executemany instead of a
+        # round-trip per item; the context manager commits atomically.
+        # BEGIN IMMEDIATE takes the write lock up front so the
+        # transaction can't hit SQLITE_BUSY upgrading from read to write
+        # mid-way, and the order_items land in one WAL commit.
+        placeholders = ",".join("?" * len(item_ids))
+        with self.conn:
+            cursor = self.conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(
+                f"INSERT INTO orders (total_revenue, total_cost) "
+                f"SELECT COALESCE(SUM(price), 0), COALESCE(SUM(cost), 0) FROM menu WHERE id IN ({placeholders})",
+                item_ids
+            )
+            order_id = cursor.lastrowid
+            cursor.executemany(
+                "INSERT INTO order_items (order_id, menu_id) VALUES (?, ?)",
+                [(order_id, item_id) for item_id in item_ids]
+            )
+
+    def get_sales_by_period(self, timeframe, show_all=False):
+        # Aggregate inside SQLite so pandas only receives one row per
+        # period instead of every order. Each timeframe also defaults to
+        # a matching lookback window so a years-old deployment doesn't
+        # scan its full history for a daily view.
+        fmt, lookback = {
+            "Daily": ("%Y-%m-%d", "-30 days"),
+            "Weekly": ("%Y-%W", "-182 days"),
+            "Monthly": ("%Y-%m", "-24 months"),
+            "Yearly": ("%Y", "-10 years"),
+        }[timeframe]
+        where = "" if show_all else "WHERE created_at >= DATE('now', ?) "
+        params = (fmt,) if show_all else (fmt, lookback)
+        with self._reader() as conn:
+            return pd.read_sql_query(
+                "SELECT strftime(?, created_at) AS period, "
+                "SUM(total_revenue) AS total_revenue, "
+                "SUM(total_cost) AS total_cost, "
+                "SUM(total_revenue - total_cost) AS profit "
+                f"FROM orders {where}GROUP BY period ORDER BY period",
+                conn,
+                params=params,
+                index_col='period'
+            )
 
-    def get_orders_df(self):
-        df = pd.read_sql_query(
-            "SELECT id, created_at, total_revenue, total_cost FROM orders", 
-            self.conn, 
-            parse_dates=['created_at']
-        )
-        df['profit'] = df['total_revenue'] - df['total_cost']
-        return df
-    
     def add_misc_expense(self, amount, note):
-        cursor = self.conn.cursor()
-        cursor.execute("INSERT INTO miscellaneous_expense (amount, note) VALUES (?, ?)", (amount, note))
-        self.conn.commit()
+        with self.conn:
+            self.conn.execute("INSERT INTO miscellaneous_expense (amount, note) VALUES (?, ?)", (amount, note))
 
     def get_misc_expenses(self):
-        return pd.read_sql_query("SELECT date, amount, note FROM miscellaneous_expense", self.conn, parse_dates=['date'])
+        with self._reader() as conn:
+            # Display-only: leave date as TEXT rather than paying per-row
+            # datetime parsing for a column st.dataframe just prints.
+            return pd.read_sql_query("SELECT date, amount, note FROM miscellaneous_expense", conn)
 
     def add_billing(self, month, total_amount):
-        cursor = self.conn.cursor()
-        cursor.execute("INSERT INTO billings (month, total_amount) VALUES (?, ?)", (month, total_amount))
-        self.conn.commit()
+        with self.conn:
+            self.conn.execute("INSERT INTO billings (month, total_amount) VALUES (?, ?)", (month, total_amount))
 
     def get_billings(self):
-        return pd.read_sql_query("SELECT month, total_amount FROM billings", self.conn)
+        with self._reader() as conn:
+            return pd.read_sql_query("SELECT month, total_amount FROM billings", conn)
 
 # Streamlit UI
 st.title("🍽️ Restaurant Management System")
 
-# Initialize database
-db = RestaurantDB()
-menu_items = db.get_menu()
-
-# Sidebar: Add menu item
-st.sidebar.header("Add Menu Item")
-name = st.sidebar.text_input("Name")
-price = st.sidebar.number_input("Price", 0.0, 10000.0, step=0.5)
-cost = st.sidebar.number_input("Cost", 0.0, 10000.0, step=0.5)
-if st.sidebar.button("Add Item"):
-    db.add_menu_item(name, price, cost)
-    st.sidebar.success("Item added")
-
-# Menu display and delete
-st.header("📋 Menu")
-for item in menu_items:
-    col1, col2 = st.columns([4,1])
-    with col1:
-        st.write(f"**{item.name}** - Sell: ${item.price:.2f} | Cost: ${item.cost:.2f}")
-    with col2:
-        if st.button("❌", key=f"del_{item.id}"):
-            db.delete_menu_item(item.id)
-            st.experimental_rerun()
-
-# Place order
-st.header("🛒 Place Order")
-selected = st.multiselect(
-    "Select items to order", 
-    options=[(item.id, item.name) for item in menu_items], 
-    format_func=lambda x: x[1]
-)
-if st.button("Place Order") and selected:
-    db.place_order([x[0] for x in selected])
-    st.success("Order placed")
-
-# Sales report
-df = db.get_orders_df()
-st.header("📈 Sales Report")
-if df.empty:
-    st.info("No orders yet. Place an order to see reports.")
-else:
+# Initialize database once per session; reruns reuse the cached connection
+@st.cache_resource
+def get_db():
+    return RestaurantDB()
+
+db = get_db()
+
+# Cached read paths: skip the SQLite round-trip and DataFrame construction
+# on reruns where nothing changed. The leading underscore keeps Streamlit
+# from trying to hash the RestaurantDB instance; mutations call
+# st.cache_data.clear() to invalidate.
+@st.cache_data(ttl=60)
+def load_menu(_db):
+    return _db.get_menu()
+
+@st.cache_data(ttl=60)
+def load_sales(_db, timeframe, show_all=False):
+    return _db.get_sales_by_period(timeframe, show_all)
+
+@st.cache_data(ttl=60)
+def load_misc_expenses(_db):
+    return _db.get_misc_expenses()
+
+@st.cache_data(ttl=60)
+def load_billings(_db):
+    return _db.get_billings()
+
+# On a cold start (or after a cache clear) the sections would otherwise
+# issue their SELECTs one after another; warming them on a thread pool
+# overlaps the queries, since each runs on its own read-only connection
+# from the pool. Warm reruns hit the cache and this is a no-op.
+def warm_caches():
+    # Attach the current ScriptRunContext to each worker so the cached
+    # loaders don't log missing-ScriptRunContext warnings from the pool.
+    ctx = get_script_run_ctx()
+
+    def run(loader, *args):
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return loader(*args)
+
+    with ThreadPoolExecutor(max_workers=4) as ex:
+        futures = [
+            ex.submit(run, load_menu, db),
+            # same arguments the report fragment passes; st.cache_data
+            # keys on the exact call, so a shorter form would warm an
+            # entry the fragment never reads
+            ex.submit(run, load_sales, db, "Daily", False),
+            ex.submit(run, load_misc_expenses, db),
+            ex.submit(run, load_billings, db),
+        ]
+        for future in futures:
+            future.result()
+
+warm_caches()
+
+# Each section is a fragment: a button click inside one only reruns that
+# section, so e.g. adding an expense no longer re-queries the menu,
+# orders and billings or re-renders the charts. Mutations that other
+# sections display call st.rerun() to refresh the whole page.
+
+@st.fragment
+def add_menu_item_section():
+    st.sidebar.header("Add Menu Item")
+    name = st.sidebar.text_input("Name")
+    price = st.sidebar.number_input("Price", 0.0, 10000.0, step=0.5)
+    cost = st.sidebar.number_input("Cost", 0.0, 10000.0, step=0.5)
+    if st.sidebar.button("Add Item"):
+        db.add_menu_item(name, price, cost)
+        st.cache_data.clear()
+        st.sidebar.success("Item added")
+        st.rerun()
+
+@st.fragment
+def menu_section():
+    # One dataframe with row selection instead of per-item columns and
+    # delete buttons: O(1) widget registrations per rerun however long
+    # the menu gets.
+    st.header("📋 Menu")
+    menu_df = pd.DataFrame(load_menu(db), columns=MenuItem._fields)
+    event = st.dataframe(
+        menu_df,
+        hide_index=True,
+        on_select="rerun",
+        selection_mode="multi-row",
+        column_config={
+            "price": st.column_config.NumberColumn("Sell", format="$%.2f"),
+            "cost": st.column_config.NumberColumn("Cost", format="$%.2f"),
+        },
+    )
+    if st.button("Delete selected") and event.selection.rows:
+        db.delete_menu_items(menu_df['id'].iloc[event.selection.rows].tolist())
+        st.cache_data.clear()
+        st.rerun()
+
+@st.fragment
+def place_order_section():
+    st.header("🛒 Place Order")
+    selected = st.multiselect(
+        "Select items to order",
+        options=[(item_id, item_name) for item_id, item_name, _price, _cost in load_menu(db)],
+        format_func=lambda x: x[1]
+    )
+    if st.button("Place Order") and selected:
+        db.place_order([x[0] for x in selected])
+        st.cache_data.clear()
+        st.success("Order placed")
+        st.rerun()
+
+@st.fragment
+def sales_report_section():
+    st.header("📈 Sales Report")
     timeframe = st.selectbox("View by", ["Daily", "Weekly", "Monthly", "Yearly"])
-    
-    if timeframe == "Daily":
-        df['period'] = df['created_at'].dt.date.astype(str)
-    elif timeframe == "Weekly":
-        df['period'] = df['created_at'].dt.to_period("W").astype(str)
-    elif timeframe == "Monthly":
-        df['period'] = df['created_at'].dt.to_period("M").astype(str)
-    else:  # Yearly
-        df['period'] = df['created_at'].dt.to_period("Y").astype(str)
-
-    grouped = df.groupby('period')[['total_revenue','total_cost','profit']].sum()
-
-    st.line_chart(grouped)
-    st.dataframe(grouped)
-
-   # Miscellaneous Expenses
-st.header("💸 Miscellaneous Expenses")
-amount = st.number_input("Expense Amount", min_value=0.0)
-note = st.text_input("Note")
-if st.button("Add Expense"):
-    db.add_misc_expense(amount, note)
-    st.success("Expense added")
-
-misc_df = db.get_misc_expenses()
-st.dataframe(misc_df)
-
-# Billings Section
-st.header("📆 Monthly Billings")
-bill_month = st.text_input("Billing Month (e.g., 2025-05)")
-bill_amount = st.number_input("Total Billing Amount", min_value=0.0)
-if st.button("Add Billing"):
-    db.add_billing(bill_month, bill_amount)
-    st.success("Billing added")
-
-billing_df = db.get_billings()
-st.dataframe(billing_df)
+    show_all = st.checkbox("Show all history")
+    grouped = load_sales(db, timeframe, show_all)
+    if grouped.empty:
+        st.info("No orders yet. Place an order to see reports.")
+    else:
+        st.line_chart(grouped)
+        st.dataframe(grouped)
+
+@st.fragment
+def misc_expenses_section():
+    st.header("💸 Miscellaneous Expenses")
+    amount = st.number_input("Expense Amount", min_value=0.0)
+    note = st.text_input("Note")
+    if st.button("Add Expense"):
+        db.add_misc_expense(amount, note)
+        st.cache_data.clear()
+        st.success("Expense added")
+    st.dataframe(load_misc_expenses(db))
+
+@st.fragment
+def billings_section():
+    st.header("📆 Monthly Billings")
+    bill_month = st.text_input("Billing Month (e.g., 2025-05)")
+    bill_amount = st.number_input("Total Billing Amount", min_value=0.0)
+    if st.button("Add Billing"):
+        db.add_billing(bill_month, bill_amount)
+        st.cache_data.clear()
+        st.success("Billing added")
+    st.dataframe(load_billings(db))
+
+add_menu_item_section()
+menu_section()
+place_order_section()
+sales_report_section()
+misc_expenses_section()
+billings_section()